@@ -1,6 +1,7 @@
 import base64
-import json
 import logging
+import time
+import uuid
 from datetime import datetime, timedelta
 from os.path import join
 from typing import Dict, List, Optional, Tuple, Union
@@ -16,7 +17,12 @@ from faaskeeper.exceptions import (
 )
 from faaskeeper.node import Node
 from faaskeeper.providers.provider import ProviderClient
-from faaskeeper.providers.serialization import DataReader, DynamoReader, S3Reader
+from faaskeeper.providers.serialization import (
+    DataReader,
+    DynamoReader,
+    S3Reader,
+    json_dumps,
+)
 from faaskeeper.stats import StorageStatistics
 from faaskeeper.watch import Watch, WatchCallbackType, WatchType
 
@@ -24,12 +30,23 @@ BENCHMARKING = True
 
 
 class AWSClient(ProviderClient):
+
+    # Maximal number of items accepted by SendMessageBatch and BatchWriteItem
+    _SQS_BATCH_SIZE = 10
+    _DYNAMODB_BATCH_SIZE = 25
+    # Maximal total size of messages in SendMessageBatch [bytes]
+    _SQS_BATCH_BYTES = 256 * 1024
+    # Retries of unprocessed items in BatchWriteItem, with exponential backoff [seconds]
+    _DYNAMODB_MAX_RETRIES = 5
+    _DYNAMODB_BACKOFF = 0.05
+
     def __init__(self, cfg: Config):
         super().__init__(cfg)
         self._cfg = cfg
         self._log = logging.getLogger("AWSClient")
         self._dynamodb = boto3.client("dynamodb", self._config.deployment_region)
         self._watch_table = f"faaskeeper-{self._config.deployment_name}-watch"
+        self._write_queue_table = f"faaskeeper-{self._config.deployment_name}-write-queue"
         self._type_serializer = TypeSerializer()
         self._type_deserializer = TypeDeserializer()
         self._data_reader: DataReader
@@ -52,6 +69,31 @@ class AWSClient(ProviderClient):
         else:
             raise NotImplementedError()
 
+    def _sqs_message(self, request_id: str, data: Dict[str, Union[str, bytes, int]]) -> dict:
+
+        # if "data" in data:
+        #    binary_data = data["data"]
+        #    del data["data"]
+        #    attributes = {"data": {"BinaryValue": binary_data, "DataType": "Binary"}}
+        # else:
+        #    binary_data = b""
+        #    attributes = {}
+        # FIXME: seperate serialization
+        payload = DynamoReader._convert_items(data)
+        if "data" in payload:
+            payload["data"]["B"] = base64.b64encode(payload["data"]["B"]).decode()
+
+        attributes: dict = {}
+        return {
+            "MessageBody": json_dumps(payload).decode(),
+            "MessageAttributes": attributes,
+            "MessageGroupId": "0",
+            "MessageDeduplicationId": request_id,
+        }
+
+    def _dynamodb_item(self, request_id: str, data: Dict[str, Union[str, bytes, int]]) -> dict:
+        return DynamoReader._convert_items({**data, "key": f"{str(uuid.uuid4())[0:4]}", "timestamp": request_id})
+
     def send_request(
         self,
         request_id: str,
@@ -59,33 +101,12 @@ class AWSClient(ProviderClient):
     ):
         # FIXME: handle failure
         try:
-            import uuid
-
             begin = datetime.now()
 
             if self._cfg.writer_queue == QueueType.SQS:
 
-                # if "data" in data:
-                #    binary_data = data["data"]
-                #    del data["data"]
-                #    attributes = {"data": {"BinaryValue": binary_data, "DataType": "Binary"}}
-                # else:
-                #    binary_data = b""
-                #    attributes = {}
-                # FIXME: seperate serialization
-                payload = DynamoReader._convert_items(data)
-                if "data" in payload:
-                    payload["data"]["B"] = base64.b64encode(payload["data"]["B"]).decode()
-
-                attributes: dict = {}
                 # FIXME: use response
-                self._sqs_client.send_message(
-                    QueueUrl=self._sqs_queue_url,
-                    MessageBody=json.dumps(payload),
-                    MessageAttributes=attributes,
-                    MessageGroupId="0",
-                    MessageDeduplicationId=request_id,
-                )
+                self._sqs_client.send_message(QueueUrl=self._sqs_queue_url, **self._sqs_message(request_id, data))
                 end = datetime.now()
                 if BENCHMARKING:
                     StorageStatistics.instance().add_write_time(int((end - begin) / timedelta(microseconds=1)))
@@ -95,10 +116,8 @@ class AWSClient(ProviderClient):
                 # FIXME: check return value
                 begin = datetime.now()
                 ret = self._dynamodb.put_item(
-                    TableName=f"faaskeeper-{self._config.deployment_name}-write-queue",
-                    Item=DynamoReader._convert_items(
-                        {**data, "key": f"{str(uuid.uuid4())[0:4]}", "timestamp": request_id}
-                    ),
+                    TableName=self._write_queue_table,
+                    Item=self._dynamodb_item(request_id, data),
                     ReturnConsumedCapacity="TOTAL",
                 )
                 end = datetime.now()
@@ -109,6 +128,137 @@ class AWSClient(ProviderClient):
         except Exception as e:
             raise AWSException(f"Failure on AWS client when sending request: {str(e)}")
 
+    def send_batch_request(
+        self, requests: List[Tuple[str, Dict[str, Union[str, bytes, int]]]]
+    ) -> Tuple[List[str], Optional[Exception]]:
+        """Send multiple requests with the smallest number of calls allowed by the writer queue.
+        The order of requests is preserved by the SQS FIFO queue.
+        We stop at the first request that could not be sent - later requests are not sent
+        to not break the ordering.
+
+        :param requests: list of pairs of request ID and request data
+        :returns: IDs of requests that were not sent and the reason of failure
+        """
+        if len(requests) == 1:
+            try:
+                self.send_request(*requests[0])
+            except Exception as e:
+                return [requests[0][0]], e
+            return [], None
+
+        if self._cfg.writer_queue == QueueType.SQS:
+            return self._send_sqs_batch(requests)
+        elif self._cfg.writer_queue == QueueType.DYNAMODB:
+            return self._send_dynamodb_batch(requests)
+        else:
+            raise NotImplementedError()
+
+    def _send_sqs_batch(
+        self, requests: List[Tuple[str, Dict[str, Union[str, bytes, int]]]]
+    ) -> Tuple[List[str], Optional[Exception]]:
+
+        # split the batch such that we don't exceed limits on the number of messages and their size
+        entries: List[dict] = []
+        chunk_size = 0
+        for idx, (request_id, data) in enumerate(requests):
+            try:
+                entry = {"Id": str(idx), **self._sqs_message(request_id, data)}
+            except Exception as e:
+                # send what precedes the invalid request - nothing after it, to keep the order
+                unsent, error = self._send_sqs_chunk(requests, entries)
+                unsent.extend(pending_id for pending_id, _ in requests[idx:])
+                if error is None:
+                    error = AWSException(f"Failure on AWS client when sending requests: {str(e)}")
+                return unsent, error
+
+            size = len(entry["MessageBody"].encode())
+            if entries and (
+                len(entries) == AWSClient._SQS_BATCH_SIZE or chunk_size + size > AWSClient._SQS_BATCH_BYTES
+            ):
+                unsent, error = self._send_sqs_chunk(requests, entries)
+                if error is not None:
+                    unsent.extend(pending_id for pending_id, _ in requests[idx:])
+                    return unsent, error
+                entries = []
+                chunk_size = 0
+            entries.append(entry)
+            chunk_size += size
+
+        return self._send_sqs_chunk(requests, entries)
+
+    def _send_sqs_chunk(
+        self, requests: List[Tuple[str, Dict[str, Union[str, bytes, int]]]], entries: List[dict]
+    ) -> Tuple[List[str], Optional[Exception]]:
+
+        if not entries:
+            return [], None
+        try:
+            begin = datetime.now()
+            ret = self._sqs_client.send_message_batch(QueueUrl=self._sqs_queue_url, Entries=entries)
+            end = datetime.now()
+            if BENCHMARKING:
+                StorageStatistics.instance().add_write_time(int((end - begin) / timedelta(microseconds=1)))
+        except Exception as e:
+            return [entry["MessageDeduplicationId"] for entry in entries], AWSException(
+                f"Failure on AWS client when sending requests: {str(e)}"
+            )
+
+        if ret.get("Failed"):
+            failed_ids = sorted(int(failure["Id"]) for failure in ret["Failed"])
+            return [requests[idx][0] for idx in failed_ids], AWSException(
+                f"Failure on AWS client when sending requests: {ret['Failed']}"
+            )
+        return [], None
+
+    def _send_dynamodb_batch(
+        self, requests: List[Tuple[str, Dict[str, Union[str, bytes, int]]]]
+    ) -> Tuple[List[str], Optional[Exception]]:
+
+        for i in range(0, len(requests), AWSClient._DYNAMODB_BATCH_SIZE):
+            last = i + AWSClient._DYNAMODB_BATCH_SIZE
+            begin = datetime.now()
+            items: Dict[str, list] = {self._write_queue_table: []}
+            # requests following an invalid one are not sent
+            error: Optional[Exception] = None
+            for request_id, data in requests[i:last]:
+                try:
+                    items[self._write_queue_table].append(
+                        {"PutRequest": {"Item": self._dynamodb_item(request_id, data)}}
+                    )
+                except Exception as e:
+                    error = e
+                    break
+            remaining = i + len(items[self._write_queue_table])
+            try:
+                # DynamoDB can refuse a part of the batch when throttling
+                retries = 0
+                while items[self._write_queue_table]:
+                    ret = self._dynamodb.batch_write_item(RequestItems=items, ReturnConsumedCapacity="TOTAL")
+                    if BENCHMARKING:
+                        for capacity in ret["ConsumedCapacity"]:
+                            StorageStatistics.instance().add_write_units(capacity["CapacityUnits"])
+                    if not ret.get("UnprocessedItems"):
+                        break
+                    items = ret["UnprocessedItems"]
+                    if retries == AWSClient._DYNAMODB_MAX_RETRIES:
+                        raise AWSException(f"Items not processed after {retries} retries")
+                    time.sleep(AWSClient._DYNAMODB_BACKOFF * 2**retries)
+                    retries += 1
+            except Exception as e:
+                error = e
+                unsent = [item["PutRequest"]["Item"]["timestamp"]["S"] for item in items[self._write_queue_table]]
+            else:
+                unsent = []
+            end = datetime.now()
+            if BENCHMARKING:
+                StorageStatistics.instance().add_write_time(int((end - begin) / timedelta(microseconds=1)))
+
+            if error is not None:
+                unsent.extend(pending_id for pending_id, _ in requests[remaining:])
+                return unsent, AWSException(f"Failure on AWS client when sending requests: {str(error)}")
+
+        return [], None
+
     def get_data(
         self, path: str, watch_callback: Optional[WatchCallbackType], listen_address: Tuple[str, int]
     ) -> Tuple[Node, Optional[Watch]]:
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 
 from faaskeeper.config import Config
 from faaskeeper.node import Node
@@ -17,6 +17,16 @@ class ProviderClient(ABC):
     def __init__(self, cfg: Config):
         self._config = cfg
 
+    @abstractmethod
+    def send_request(self, request_id: str, data: Dict[str, Union[str, bytes, int]]):
+        pass
+
+    @abstractmethod
+    def send_batch_request(
+        self, requests: List[Tuple[str, Dict[str, Union[str, bytes, int]]]]
+    ) -> Tuple[List[str], Optional[Exception]]:
+        pass
+
     @abstractmethod
     def get_data(
         self, path: str, watch: Optional[WatchCallbackType], listen_address: Tuple[str, int]
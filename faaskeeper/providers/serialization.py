@@ -1,3 +1,4 @@
+import json
 import struct
 from abc import ABC, abstractmethod
 from datetime import datetime, timedelta
@@ -16,6 +17,21 @@ from faaskeeper.version import EpochCounter, SystemCounter, Version
 # FIXME: global config
 BENCHMARKING = True
 
+"""
+    Messages sent to the service are JSON documents.
+    We serialize them with the faster orjson library when it is installed.
+
+    Received messages are always parsed with the standard library:
+    orjson converts integers longer than 64 bits to floats, and
+    system counters in replies do not fit into 64 bits.
+"""
+try:
+    from orjson import dumps as json_dumps
+except ImportError:
+
+    def json_dumps(obj) -> bytes:  # type: ignore
+        return json.dumps(obj).encode()
+
 
 class DataReader(ABC):
     def __init__(self, deployment_name: str):
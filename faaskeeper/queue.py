@@ -1,3 +1,4 @@
+import codecs
 import hashlib
 import json
 import logging
@@ -5,24 +6,24 @@ import select
 import socket
 import time
 import urllib.request
-from datetime import datetime
+from collections import deque
 from enum import Enum
-from queue import Empty, Queue
+from functools import lru_cache
 from threading import Event, Lock, Thread
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Callable, Deque, Dict, List, Optional, Tuple, Union
 
 import boto3
 from botocore.exceptions import ClientError
 
 from faaskeeper.config import Config
 from faaskeeper.exceptions import (
-    ProviderException,
     SessionClosingException,
     TimeoutException,
 )
 from faaskeeper.node import Node
-from faaskeeper.operations import Operation
+from faaskeeper.operations import Operation, RequestOperation
 from faaskeeper.providers.provider import ProviderClient
+from faaskeeper.providers.serialization import json_dumps
 from faaskeeper.threading import Future
 from faaskeeper.watch import Watch, WatchedEvent, WatchEventType, WatchType
 
@@ -40,6 +41,39 @@ def wait_until(timeout: float, interval: float, condition, *args):
         time.sleep(interval)
 
 
+@lru_cache(maxsize=4096)
+def hash_path(path: str) -> int:
+    """Compute the key of a node path in the watch registry.
+    Watches are usually set repeatedly on the same paths, and the results are
+    memoized in a bounded LRU cache to avoid hashing a path on every event.
+
+    The key is the first 64 bits of the MD5 hash, stored as an integer.
+    The hash function cannot be replaced with a faster one: the service
+    identifies watched paths in epoch counters with their MD5 digests,
+    and both keys must agree (see `hash_epoch_path`).
+
+    :param path: node path
+    :returns: truncated MD5 hash of the path
+    """
+    return int.from_bytes(hashlib.md5(path.encode()).digest()[:8], "little")
+
+
+def hash_epoch_path(epoch_entry: str) -> Optional[int]:
+    """Convert the path hash stored in the epoch counter into the watch key.
+    The service stores entries beginning with the hex digest of the MD5 hash,
+    followed by an underscore, e.g., "{hash}_{...}".
+    Only the leading 64 bits of the digest are read, and the entry does not
+    have to be split.
+
+    :param epoch_entry: epoch counter entry or hex digest of the MD5 hash of a node path
+    :returns: truncated MD5 hash of the path, None if the entry does not begin with a hex digest
+    """
+    try:
+        return int.from_bytes(bytes.fromhex(epoch_entry[:16]), "little")
+    except ValueError:
+        return None
+
+
 """
     Architecture of the receive queue systems on the client.
     We must handle three types of events:
@@ -69,32 +103,46 @@ class EventQueue:
         In the current implementation, callbacks block the only thread.
     """
 
+    # must be a power of two
+    _WATCH_SHARDS = 16
+
     def __init__(self):
-        self._queue = Queue()
+        # the queue has a single consumer, and deque is safe for concurrent appends and pops
+        self._queue: Deque[Tuple] = deque()
+        self._not_empty = Event()
         # Stores hash of node -> watches
         # User could have multiple watches per node (exists, get_data)
-        self._watches: Dict[str, List[Watch]] = {}
-        self._watches_lock = Lock()
+        # Watches are partitioned by the hash, and each shard has its own lock
+        self._watches: List[Dict[int, List[Watch]]] = [{} for _ in range(EventQueue._WATCH_SHARDS)]
+        self._watches_locks = [Lock() for _ in range(EventQueue._WATCH_SHARDS)]
         self._closing = False
         self._log = logging.getLogger("EventQueue")
 
+    @staticmethod
+    def _shard(hashed_path: int) -> int:
+        return hashed_path & (EventQueue._WATCH_SHARDS - 1)
+
+    def _put(self, event: Tuple):
+        self._queue.append(event)
+        self._not_empty.set()
+
     def add_expected_result(self, request_id: int, request: Operation, future: Future):
         if self._closing:
             raise SessionClosingException()
 
-        self._queue.put((EventQueue.EventType.CLOUD_EXPECTED_RESULT, request_id, request, future))
+        self._put((EventQueue.EventType.CLOUD_EXPECTED_RESULT, request_id, request, future))
 
     def add_direct_result(self, request_id: int, result: Union[Node, Exception], future: Future):
         if self._closing:
             raise SessionClosingException()
 
-        self._queue.put((EventQueue.EventType.CLOUD_DIRECT_RESULT, request_id, result, future))
+        self._put((EventQueue.EventType.CLOUD_DIRECT_RESULT, request_id, result, future))
 
     def add_indirect_result(self, result: dict):
         if self._closing:
             raise SessionClosingException()
 
-        self._queue.put((EventQueue.EventType.CLOUD_INDIRECT_RESULT, result))
+        self._put((EventQueue.EventType.CLOUD_INDIRECT_RESULT, result))
 
     def add_watch_notification(self, result: dict):
         if self._closing:
@@ -104,36 +152,45 @@ class EventQueue:
         watch_event = WatchEventType(result["watch-event"])
         timestamp = result["timestamp"]
 
-        hashed_path = hashlib.md5(path.encode()).hexdigest()
+        hashed_path = hash_path(path)
         # FIXME: check timestamp of event with our watch
         # FIXME: Full implementation of different types
-        with self._watches_lock:
-            existing_watches = self._watches.get(hashed_path)
-            if existing_watches:
-                for idx, w in enumerate(existing_watches):
-                    if watch_event == WatchEventType.NODE_DATA_CHANGED:
-                        if w.watch_type == WatchType.GET_DATA:
-                            self._queue.put(
-                                (
-                                    EventQueue.EventType.WATCH_NOTIFICATION,
-                                    w,
-                                    WatchedEvent(watch_event, path, timestamp),
-                                )
-                            )
-                            del existing_watches[idx]
-                        return
-                self._log.warn(f"Ignoring unknown watch notification for even {watch_event} on path {path}")
-            else:
-                self._log.warn(f"Ignoring unknown watch notification for even {watch_event} on path {path}")
+        # only remove triggered watches under the lock - notify after releasing it
+        triggered_watches = []
+        shard = EventQueue._shard(hashed_path)
+        watches = self._watches[shard]
+        with self._watches_locks[shard]:
+            existing_watches = watches.get(hashed_path)
+            if existing_watches and watch_event == WatchEventType.NODE_DATA_CHANGED:
+                remaining_watches = []
+                for w in existing_watches:
+                    if w.watch_type == WatchType.GET_DATA:
+                        triggered_watches.append(w)
+                    else:
+                        remaining_watches.append(w)
+                if remaining_watches:
+                    watches[hashed_path] = remaining_watches
+                else:
+                    del watches[hashed_path]
+
+        if not triggered_watches:
+            self._log.warning("Ignoring unknown watch notification for even %s on path %s", watch_event, path)
+            return
+
+        event = WatchedEvent(watch_event, path, timestamp)
+        for w in triggered_watches:
+            self._put((EventQueue.EventType.WATCH_NOTIFICATION, w, event))
 
     def add_watch(self, path: str, watch: Watch):
         if self._closing:
             raise SessionClosingException()
 
+        hashed_path = hash_path(path)
+        shard = EventQueue._shard(hashed_path)
+        watches = self._watches[shard]
         # verify that we don't replace watches
-        with self._watches_lock:
-            hashed_path = hashlib.md5(path.encode()).hexdigest()
-            existing_watches = self._watches.get(hashed_path)
+        with self._watches_locks[shard]:
+            existing_watches = watches.get(hashed_path)
             if existing_watches:
                 for idx, w in enumerate(existing_watches):
                     # Replace existing watch
@@ -143,37 +200,52 @@ class EventQueue:
                         existing_watches[idx] = watch
                         return
                 # watch doesn't exist yet
-                self._watches[hashed_path].append(watch)
+                existing_watches.append(watch)
             else:
-                self._watches[hashed_path] = [watch]
+                watches[hashed_path] = [watch]
 
     # FIXME: find by watch type?
     # get only watches older than timestamp - avoid getting watch that we
     # just set a moment ago
-    def get_watches(self, paths: List[str], timestamp: int) -> List[Watch]:
+    def get_watches(self, paths: List[int], timestamp: int) -> List[Watch]:
         if self._closing:
             raise SessionClosingException()
 
-        # verify that we don't replace watches
+        # acquire the lock of each shard only once
+        shards: Dict[int, List[int]] = {}
+        for p in paths:
+            shards.setdefault(EventQueue._shard(p), []).append(p)
+
         watches = []
-        with self._watches_lock:
-            for p in paths:
-                existing_watches = self._watches.get(p, [])
-                watches_removed = 0
-                for w in existing_watches:
-                    if w.timestamp < timestamp:
-                        watches.append(w)
-                        watches_removed += 1
-                # FIXME: partial removal
-                if watches_removed == len(existing_watches):
-                    self._watches.pop(p, None)
+        for shard, shard_paths in shards.items():
+            shard_watches = self._watches[shard]
+            with self._watches_locks[shard]:
+                for p in shard_paths:
+                    existing_watches = shard_watches.get(p)
+                    if not existing_watches:
+                        continue
+                    remaining_watches = []
+                    for w in existing_watches:
+                        if w.timestamp < timestamp:
+                            watches.append(w)
+                        else:
+                            remaining_watches.append(w)
+                    if remaining_watches:
+                        shard_watches[p] = remaining_watches
+                    else:
+                        del shard_watches[p]
         return watches
 
-    def get(self) -> Optional[Tuple]:
-        try:
-            return self._queue.get(block=True, timeout=0.5)
-        except Empty:
-            return None
+    def get_batch(self) -> List[Tuple]:
+        """Wait for the next event and return it together with all other pending events.
+
+        :returns: list of events, empty if no event arrived before timeout
+        """
+        if not self._queue:
+            self._not_empty.wait(0.5)
+            # events added after clearing will set the flag again
+            self._not_empty.clear()
+        return [self._queue.popleft() for _ in range(len(self._queue))]
 
     def close(self):
         self._closing = True
@@ -181,7 +253,9 @@ class EventQueue:
 
 class WorkQueue:
     def __init__(self):
-        self._queue = Queue()
+        # the queue has a single consumer, and deque is safe for concurrent appends and pops
+        self._queue: Deque[Tuple[int, Operation, Future]] = deque()
+        self._not_empty = Event()
         self._closing = False
         self._request_count = 0
 
@@ -189,13 +263,23 @@ class WorkQueue:
         if self._closing:
             raise SessionClosingException()
 
-        self._queue.put((self._request_count, op, fut))
+        self._queue.append((self._request_count, op, fut))
+        self._not_empty.set()
         self._request_count += 1
 
     def get(self) -> Optional[Tuple[int, Operation, Future]]:
+        request = self.get_nowait()
+        if request is None:
+            self._not_empty.wait(0.5)
+            # requests added after clearing will set the flag again
+            self._not_empty.clear()
+            request = self.get_nowait()
+        return request
+
+    def get_nowait(self) -> Optional[Tuple[int, Operation, Future]]:
         try:
-            return self._queue.get(block=True, timeout=0.5)
-        except Empty:
+            return self._queue.popleft()
+        except IndexError:
             return None
 
     def close(self):
@@ -203,23 +287,36 @@ class WorkQueue:
 
     def wait_close(self, timeout: float = -1):
         if timeout > 0:
-            wait_until(timeout, 0.1, self._queue.empty)
-            if not self._queue.empty():
+            wait_until(timeout, 0.1, lambda: not self._queue)
+            if self._queue:
                 raise TimeoutException(timeout)
 
 
 class Loop:
+
+    # size of a single read from a connection [bytes]
+    _RECV_SIZE = 65536
+
     def __init__(self):
 
         self._epoll = select.epoll()
         self.connections = {}
+        # received text that does not form a complete message yet
         self.requests = {}
         self.responses = {}
+        # a UTF-8 character can be split between reads
+        self._text_decoders = {}
+        self._json_decoder = json.JSONDecoder()
 
         self.server_fd = -1
 
         self._handlers = {}
 
+        # writing to the socket pair wakes up the loop blocked on polling
+        self._wakeup_read, self._wakeup_write = socket.socketpair()
+        self._wakeup_read.setblocking(False)
+        self._epoll.register(self._wakeup_read.fileno(), select.EPOLLIN)
+
     @classmethod
     def instance(cls):
         if not hasattr(cls, "_instance"):
@@ -234,18 +331,75 @@ class Loop:
         self._handlers[fd] = handler
 
     def handle_connection(self, connection):
+        # replies to heartbeats are small and should not be delayed by Nagle's algorithm
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         self._epoll.register(connection.fileno(), select.EPOLLIN | select.EPOLLET)
         self.connections[connection.fileno()] = connection
-        self.requests[connection.fileno()] = b""
+        self.requests[connection.fileno()] = ""
+        self._text_decoders[connection.fileno()] = codecs.getincrementaldecoder("utf-8")()
+
+    def wakeup(self):
+        self._wakeup_write.send(b"\0")
+
+    def close_connection(self, fileno):
+        self._epoll.unregister(fileno)
+        self.connections[fileno].close()
+        del self.connections[fileno]
+        del self.requests[fileno]
+        del self._text_decoders[fileno]
+
+    def parse_messages(self, fileno, data: bytes, final: bool) -> List[dict]:
+        """Extract all complete JSON documents received on a connection.
+        A message can be split between many reads, and a single read can
+        contain many messages. The incomplete remainder is kept until the next read.
+
+        :param fileno: connection descriptor
+        :param data: newly received data
+        :param final: true if no more data will be received on the connection
+        :returns: list of received messages
+        """
+        text = (self.requests[fileno] + self._text_decoders[fileno].decode(data, final)).lstrip()
+        messages = []
+        while text:
+            try:
+                msg, end = self._json_decoder.raw_decode(text)
+            except json.JSONDecodeError:
+                # incomplete message
+                break
+            messages.append(msg)
+            text = text[end:].lstrip()
+        self.requests[fileno] = text
+        return messages
+
+    @staticmethod
+    def receive(connection) -> Tuple[bytearray, bool]:
+        """Read all available data - with edge-triggered polling, we are not
+        notified again about data left in the socket.
+
+        :param connection: non-blocking socket
+        :returns: received data and true if the connection has been closed
+        """
+        data = bytearray()
+        while True:
+            try:
+                chunk = connection.recv(Loop._RECV_SIZE)
+            except BlockingIOError:
+                return data, False
+            if not chunk:
+                return data, True
+            data += chunk
 
     def start(self, event_to_wait, log, event_queue):
 
         while event_to_wait.is_set():
 
-            events = self._epoll.poll(1)
+            events = self._epoll.poll()
             for fileno, event in events:
 
-                if fileno == self.server_fd:
+                if fileno == self._wakeup_read.fileno():
+                    self.receive(self._wakeup_read)
+
+                elif fileno == self.server_fd:
                     accept_connection = self._handlers[fileno]
                     accept_connection()
 
@@ -259,14 +413,19 @@ class Loop:
                     #    print(self.requests[fileno])
                     # self._epoll.modify(fileno, select.EPOLLIN | select.EPOLLET)
                     conn = self.connections[fileno]
-                    data = json.loads(conn.recv(1024).decode())
-                    log.info(f"Received message: {data}")
-                    if "type" in data and data["type"] == "heartbeat":
-                        conn.sendall(json.dumps({"status": "alive"}).encode())
-                    elif "watch-event" in data:
-                        event_queue.add_watch_notification(data)
-                    else:
-                        event_queue.add_indirect_result(data)
+                    msg, closed = self.receive(conn)
+                    for data in self.parse_messages(fileno, msg, closed):
+                        log.info("Received message: %s", data)
+                        if "type" in data and data["type"] == "heartbeat":
+                            conn.sendall(json_dumps({"status": "alive"}))
+                        elif "watch-event" in data:
+                            event_queue.add_watch_notification(data)
+                        else:
+                            event_queue.add_indirect_result(data)
+                    if closed:
+                        if self.requests[fileno]:
+                            log.error("Ignoring incomplete message: %s", self.requests[fileno])
+                        self.close_connection(fileno)
 
                 # elif event & select.EPOLLOUT:
                 #    try:
@@ -280,9 +439,7 @@ class Loop:
                 #        self.connections[fileno].shutdown(socket.SHUT_RDWR)
 
                 elif event & select.EPOLLHUP:
-                    self._epoll.unregister(fileno)
-                    self.connections[fileno].close()
-                    del self.connections[fileno]
+                    self.close_connection(fileno)
 
     def stop(self, fd):
         print("stopped epoll")
@@ -294,6 +451,10 @@ class ResponseListener(Thread):
     """The thread receives replies and watch notifications from the service.
     After calling `run`, the thread runs in the background until `stop` is called.
 
+    A single thread serves all connections from the service: the epoll loop
+    accepts all pending connections and reads them without blocking, and the processing
+    of replies is bound by the interpreter lock, not by the number of receiving threads.
+
     :param event_queue: reference to the event queue processing replies
     :param port: port to be used for listening for replies, defalts to -1
     """
@@ -306,6 +467,19 @@ class ResponseListener(Thread):
     def port(self):
         return self._port
 
+    _public_ip: Optional[str] = None
+
+    @classmethod
+    def get_public_ip(cls) -> str:
+        """
+        The public address does not change during the lifetime of the client,
+        and we query it only for the first listener.
+        """
+        if cls._public_ip is None:
+            req = urllib.request.urlopen("https://checkip.amazonaws.com")
+            cls._public_ip = req.read().decode().strip()
+        return cls._public_ip
+
     def __init__(self, event_queue: EventQueue, port: int = -1):
 
         super().__init__(daemon=True)
@@ -319,8 +493,7 @@ class ResponseListener(Thread):
         self._socket.bind(("", port if port != -1 else 0))
         self._socket.setblocking(False)
 
-        req = urllib.request.urlopen("https://checkip.amazonaws.com")
-        self._public_addr = req.read().decode().strip()
+        self._public_addr = ResponseListener.get_public_ip()
         self._port = self._socket.getsockname()[1]
         self._log = logging.getLogger("ResponseListener")
 
@@ -329,10 +502,15 @@ class ResponseListener(Thread):
         self.start()
 
     def accept_connection(self):
-        connection, address = self._socket.accept()
-        self._log.info(f"Connected with {address}")
-        connection.setblocking(0)
-        self.loop.handle_connection(connection)
+        # with edge-triggered polling, many pending connections are reported by a single event
+        while True:
+            try:
+                connection, address = self._socket.accept()
+            except BlockingIOError:
+                return
+            self._log.info("Connected with %s", address)
+            connection.setblocking(0)
+            self.loop.handle_connection(connection)
 
     def run(self):
 
@@ -340,11 +518,11 @@ class ResponseListener(Thread):
         self.loop.register_handler(self._socket.fileno())
         self.loop.add_handler(self._socket.fileno(), self.accept_connection)
         self._socket.setblocking(0)
-        self._log.info(f"Begin listening on {self._public_addr}:{self._port}")
+        self._log.info("Begin listening on %s:%d", self._public_addr, self._port)
 
         self.loop.start(self._work_event, self._log, self._event_queue)
 
-        self._log.info(f"Close response listener thread on {self._public_addr}:{self._port}")
+        self._log.info("Close response listener thread on %s:%d", self._public_addr, self._port)
         self._socket.close()
         self._work_event.set()
 
@@ -352,11 +530,9 @@ class ResponseListener(Thread):
         """
         Clear work event and wait until run method sets it again before exiting.
         This certifies that thread has finished.
-
-        Since the thread listens on a socket with a time out of 0.5 seconds,
-        the stopping can take up to 0.5 second in the worst case.
         """
         self._work_event.clear()
+        self.loop.wakeup()
         self._work_event.wait()
 
 
@@ -371,7 +547,7 @@ class SQSListener(Thread):
         try:
             self._queue_url = self._sqs.get_queue_url(QueueName=self._queue_name)["QueueUrl"]
         except ClientError as error:
-            logging.exception(f"Couldn't get queue named {self._queue_name}")
+            logging.exception("Couldn't get queue named %s", self._queue_name)
             raise error
 
         self._event_queue = event_queue
@@ -383,7 +559,7 @@ class SQSListener(Thread):
 
     def run(self):
 
-        self._log.info(f"Start SQS response listener thread")
+        self._log.info("Start SQS response listener thread")
 
         while self._work_event.is_set():
 
@@ -401,7 +577,7 @@ class SQSListener(Thread):
 
             for idx, msg in enumerate(response["Messages"]):
                 data = json.loads(msg["Body"])
-                self._log.info(f"Received message: {data}")
+                self._log.info("Received message: %s", data)
                 if "type" in data and data["type"] == "heartbeat":
                     # FIXME: add heartbeats
                     pass
@@ -415,7 +591,7 @@ class SQSListener(Thread):
                 if len(receipt_handles) > 0:
                     self._sqs.delete_message_batch(QueueUrl=self._queue_url, Entries=receipt_handles)
 
-        self._log.info(f"Close SQS response listener thread")
+        self._log.info("Close SQS response listener thread")
         self._work_event.set()
 
     def stop(self):
@@ -433,10 +609,18 @@ class SubmitterThread(Thread):
     The thread polls requests from work queue and submits them.
     After calling `run`, the thread runs in the background until `stop` is called.
 
+    Requests are submitted sequentially, and we don't overlap cloud calls.
+    Results must arrive in the order of submission, since the sorter thread matches
+    them against the queue of expected results, and the FIFO writer queue orders
+    only requests it has already received.
+    Instead, pending requests are sent together in batches.
+
     :param session_id: ID of active session
     :param service_name: name of FK deployment in cloud
     """
 
+    _MAX_BATCH_SIZE = 25
+
     def __init__(
         self,
         session_id: str,
@@ -447,10 +631,24 @@ class SubmitterThread(Thread):
     ):
         super().__init__(daemon=True)
         self._session_id = session_id
+        # request ID format is: {session_id}-{local_idx}
+        self._request_id_prefix = f"{session_id}-"
         self._queue = queue
         self._event_queue = event_queue
         self._provider_client = provider_client
         self._response_handler = response_handler
+        # FIXME: abstract it away
+        self._listener_address: Tuple
+        self._listener_address_dict: Dict[str, Union[str, int]]
+        if isinstance(response_handler, ResponseListener):
+            self._listener_address = (response_handler.address, response_handler.port)
+            self._listener_address_dict = {
+                "sourceIP": response_handler.address,
+                "sourcePort": response_handler.port,
+            }
+        else:
+            self._listener_address = ()
+            self._listener_address_dict = {}
         self._log = logging.getLogger("WorkerThread")
         self._work_event = Event()
         self._work_event.set()
@@ -465,20 +663,41 @@ class SubmitterThread(Thread):
         self._work_event.clear()
         self._work_event.wait()
 
-    # FIXME: batching of write requests
+    def _submit_batch(self, batch: List[Tuple[int, RequestOperation, Future]]):
+        """
+        Send a batch of cloud requests, in order, to the underlying cloud service.
+        Only requests that were not sent receive an exception - the other ones
+        will receive their results from the service.
+        """
+        if not batch:
+            return
+        requests: Dict[str, Tuple[int, RequestOperation, Future]] = {
+            self._request_id_prefix + str(req_id): (req_id, request, future) for req_id, request, future in batch
+        }
+        payloads: List[Tuple[str, Dict[str, Union[str, bytes, int]]]] = []
+        unsent: List[str] = []
+        error: Optional[Exception] = None
+        try:
+            for request_id, (_, request, _) in requests.items():
+                payloads.append((request_id, {**request.generate_request(), **self._listener_address_dict}))
+        except Exception as e:
+            # requests following the invalid one are not sent, to preserve the order
+            invalid = len(payloads)
+            unsent = list(requests)[invalid:]
+            error = e
+        if payloads:
+            unsent_payloads, send_error = self._provider_client.send_batch_request(payloads)
+            if send_error is not None:
+                unsent = unsent_payloads + unsent
+                error = send_error
+        for request_id in unsent:
+            assert error is not None
+            req_id, _, future = requests[request_id]
+            self._event_queue.add_direct_result(req_id, error, future)
+
     def run(self):
 
-        self._log.info(f"Begin submission worker thread.")
-        # FIXME: abstract it away
-        if isinstance(self._response_handler, ResponseListener):
-            listener_address = (self._response_handler.address, self._response_handler.port)
-            listener_address_dict = {
-                "sourceIP": self._response_handler.address,
-                "sourcePort": self._response_handler.port,
-            }
-        else:
-            listener_address = ()
-            listener_address_dict = {}
+        self._log.info("Begin submission worker thread.")
 
         while self._work_event.is_set():
 
@@ -486,38 +705,53 @@ class SubmitterThread(Thread):
             if not submission:
                 continue
 
-            req_id, request, future = submission
+            """
+            Drain pending requests and submit cloud requests in batches.
+            The batch grows with the backlog of the work queue, up to the
+            maximal batch size.
+            Direct requests cannot overtake cloud requests submitted before them,
+            and the pending batch is sent before executing a direct request.
+            """
+            batch: List[Tuple[int, RequestOperation, Future]] = []
+            while submission:
+
+                req_id, request, future = submission
+                try:
+                    if request.is_cloud_request():
+                        self._log.info("Begin executing operation: %s", request.name)
+                        self._event_queue.add_expected_result(req_id, request, future)
+                        batch.append((req_id, request, future))
+                        if len(batch) == SubmitterThread._MAX_BATCH_SIZE:
+                            self._submit_batch(batch)
+                            batch = []
+                    else:
+                        self._submit_batch(batch)
+                        batch = []
+                        # FIXME launch on a pool - then it becomes expected result as well
+                        try:
+                            # FIXME: every operation should return (res, watch)
+                            res = self._provider_client.execute_request(request, self._listener_address)
+                            if res is not None and len(res) > 0:
+                                if res[1]:
+                                    self._event_queue.add_watch(request.path, res[1])
+                                self._event_queue.add_direct_result(req_id, res[0], future)
+                            else:
+                                self._event_queue.add_direct_result(req_id, res, future)
+                        except Exception as e:
+                            self._event_queue.add_direct_result(req_id, e, future)
+                except Exception as e:
+                    self._event_queue.add_direct_result(req_id, e, future)
+                    self._log.info("Finish executing operation: %s", request.name)
+
+                submission = self._queue.get_nowait()
+
             try:
-                if request.is_cloud_request():
-                    """
-                    Send the request to execution to the underlying cloud service.
-                    """
-                    self._log.info(f"Begin executing operation: {request.name}")
-                    self._event_queue.add_expected_result(req_id, request, future)
-                    self._provider_client.send_request(
-                        request_id=f"{self._session_id}-{req_id}",
-                        data={**request.generate_request(), **listener_address_dict},
-                    )
-                else:
-                    # FIXME launch on a pool - then it becomes expected result as well
-                    try:
-                        # FIXME: every operation should return (res, watch)
-                        res = self._provider_client.execute_request(request, listener_address)
-                        if res is not None and len(res) > 0:
-                            if res[1]:
-                                self._event_queue.add_watch(request.path, res[1])
-                            self._event_queue.add_direct_result(req_id, res[0], future)
-                        else:
-                            self._event_queue.add_direct_result(req_id, res, future)
-                    except Exception as e:
-                        self._event_queue.add_direct_result(req_id, e, future)
-            except ProviderException as e:
-                self._event_queue.add_direct_result(req_id, e, future)
+                self._submit_batch(batch)
             except Exception as e:
-                self._event_queue.add_direct_result(req_id, e, future)
-                self._log.info(f"Finish executing operation: {request.name}")
+                for req_id, _, future in batch:
+                    self._event_queue.add_direct_result(req_id, e, future)
 
-        self._log.info(f"Close queue worker thread.")
+        self._log.info("Close queue worker thread.")
         self._work_event.set()
 
 
@@ -537,6 +771,14 @@ class SorterThread(Thread):
         self._log = logging.getLogger("SorterThread")
         self._work_event = Event()
         self._work_event.set()
+        self._futures: Deque[Tuple[int, RequestOperation, Future, float]] = deque()
+        # each handler returns true if it processed a result
+        self._handlers: Dict[EventQueue.EventType, Callable[[Tuple], bool]] = {
+            EventQueue.EventType.CLOUD_EXPECTED_RESULT: self._handle_expected_result,
+            EventQueue.EventType.CLOUD_DIRECT_RESULT: self._handle_direct_result,
+            EventQueue.EventType.CLOUD_INDIRECT_RESULT: self._handle_indirect_result,
+            EventQueue.EventType.WATCH_NOTIFICATION: self._handle_watch_notification,
+        }
 
         self.start()
 
@@ -548,96 +790,98 @@ class SorterThread(Thread):
         self._work_event.clear()
         self._work_event.wait()
 
-    def _check_timeout(self, futures: list):
-
-        cur_timestamp = datetime.now().timestamp()
-        i = 0
-        while i < len(futures):
-            fut = futures[i]
-            fut_timestamp = fut[-1]
-            # timeout!
-            if cur_timestamp - fut_timestamp >= 5.0:
-                fut[2].set_exception(TimeoutException(5.0))
-                # remove the element from the list
-                futures.pop(0)
-                i += 1
-            else:
-                break
-
-    def run(self):
+    def _check_timeout(self):
+
+        cur_timestamp = time.monotonic()
+        # futures are ordered by submission time - timeout!
+        while self._futures and cur_timestamp - self._futures[0][-1] >= 5.0:
+            self._futures.popleft()[2].set_exception(TimeoutException(5.0))
+
+    # FIXME: watches should be handled in a different data structure
+    def _handle_expected_result(self, submission: Tuple) -> bool:
+        self._futures.append((*submission[1:], time.monotonic()))
+        return False
+
+    def _handle_direct_result(self, submission: Tuple) -> bool:
+        req_id, result, future = submission[1:]
+        # FIXME - exists should always return node (fix implementation!)
+        # FIXME - get_children should return the parent (fix implementation!)
+        if result is not None and isinstance(result, Node):
+            modified = result.modified
+            timestamp = modified.system.sum
+            # the hash of the path is memoized - we hashed it when adding a watch
+            watches = self._queue.get_watches([hash_path(result.path)], timestamp)
+            # we have watch on ourself
+            if watches:
+                # FIXME: Move to some library
+                event = WatchedEvent(WatchEventType.NODE_DATA_CHANGED, result.path, timestamp)
+                for w in watches:
+                    w.generate_message(event)
+            # read watches from epoch
+            # FIXME: hide under abstraction of epoch
+            assert modified.epoch is not None and modified.epoch.version is not None
+            # many epoch entries can refer to the same path
+            # entries that are not path hashes cannot match any watch
+            paths = list({key for key in map(hash_epoch_path, modified.epoch.version) if key is not None})
+            watches = self._queue.get_watches(paths, timestamp)
+            # FIXME: stall read
+
+        # FIXME: enforce ordering - watches
+        if isinstance(result, Exception):
+            # a cloud request that was not sent will never receive a reply
+            for idx, pending in enumerate(self._futures):
+                if pending[0] == req_id:
+                    del self._futures[idx]
+                    break
+            # the request might have already timed out
+            if future.done():
+                return True
+            future.set_exception(result)
+        else:
+            future.set_result(result)
+        return True
 
-        self._log.info(f"Begin sorter thread.")
+    def _handle_indirect_result(self, submission: Tuple) -> bool:
+        result = submission[1]
+        # event format is: {session_id}-{local_idx}
+        req_id = int(result["event"].split("-")[1])
 
-        futures = []
-        # results = []
+        if len(self._futures) == 0:
+            self._log.error("Ignoring the result %s with ID %d for a non-existing future", result, req_id)
+            return True
 
-        while self._work_event.is_set():
-
-            processed_result = False
-            submission = self._queue.get()
+        # FIXME: enforce ordering
+        assert self._futures[0][0] == req_id
+        req_id, request, future, _ = self._futures.popleft()
+        request.process_result(result, future)
+        return True
 
-            # FIXME: add timestamps to find missing events
-            # if not event.wait(5.0):
-            if not submission:
-                self._check_timeout(futures)
-                continue
+    def _handle_watch_notification(self, submission: Tuple) -> bool:
+        # FIXME: ordering
+        watch = submission[1]
+        event = submission[2]
 
-            # FIXME: watches should be handled in a different data structure
-            # we received result
-            if submission[0] == EventQueue.EventType.CLOUD_EXPECTED_RESULT:
-                futures.append((*submission[1:], datetime.now().timestamp()))
-            # we have a direct result
-            elif submission[0] == EventQueue.EventType.CLOUD_DIRECT_RESULT:
-                req_id, result, future = submission[1:]
-                # FIXME - exists should always return node (fix implementation!)
-                # FIXME - get_children should return the parent (fix implementation!)
-                if result is not None and isinstance(result, Node):
-                    timestamp = result.modified.system.sum
-                    watches = self._queue.get_watches([hashlib.md5(result.path.encode()).hexdigest()], timestamp)
-                    # we have watch on ourself
-                    for w in watches:
-                        # FIXME: Move to some library
-                        w.generate_message(WatchedEvent(WatchEventType.NODE_DATA_CHANGED, result.path, timestamp))
-                    # read watches from epoch
-                    paths = []
-                    # FIXME: hide under abstraction of epoch
-                    for p in result.modified.epoch.version:
-                        paths.append(p.split("_")[0])
-                    watches = self._queue.get_watches(paths, timestamp)
-                    # FIXME: stall read
-
-                # FIXME: enforce ordering - watches
-                if isinstance(result, Exception):
-                    future.set_exception(result)
-                else:
-                    future.set_result(result)
-                processed_result = True
-            elif submission[0] == EventQueue.EventType.CLOUD_INDIRECT_RESULT:
+        watch.generate_message(event)
+        return False
 
-                result = submission[1]
-                # event format is: {session_id}-{local_idx}
-                req_id = int(result["event"].split("-")[1])
+    def run(self):
 
-                if len(futures) == 0:
-                    self._log.error(f"Ignoring the result {result} with ID {req_id} for a non-existing future")
-                    continue
+        self._log.info("Begin sorter thread.")
 
-                # FIXME: enforce ordering
-                assert futures[0][0] == req_id
-                req_id, request, future, _ = futures.pop(0)
-                request.process_result(result, future)
-                processed_result = True
-            elif submission[0] == EventQueue.EventType.WATCH_NOTIFICATION:
+        while self._work_event.is_set():
 
-                # FIXME: ordering
-                watch = submission[1]
-                event = submission[2]
+            submissions = self._queue.get_batch()
 
-                watch.generate_message(event)
+            # FIXME: add timestamps to find missing events
+            # if not event.wait(5.0):
+            if not submissions:
+                self._check_timeout()
+                continue
 
-            # if we processed result, then timeout could not have happend
-            if not processed_result:
-                self._check_timeout(futures)
+            for submission in submissions:
+                # if we processed result, then timeout could not have happend
+                if not self._handlers[submission[0]](submission):
+                    self._check_timeout()
 
-        self._log.info(f"Close queue worker thread.")
+        self._log.info("Close queue worker thread.")
         self._work_event.set()
@@ -3,6 +3,7 @@
 import argparse
 import os
 import subprocess
+import venv
 
 parser = argparse.ArgumentParser(description="Install FK and dependencies.")
 parser.add_argument('--venv', metavar='DIR', type=str, default="python-venv", help='destination of local Python virtual environment')
@@ -10,22 +11,27 @@ args = parser.parse_args()
 
 def execute(cmd):
     ret = subprocess.run(
-        cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
     )
     if ret.returncode:
         raise RuntimeError(
-            "Running {} failed!\n Output: {}".format(cmd, ret.stdout.decode("utf-8"))
+            "Running {} failed!\n Output: {}".format(" ".join(cmd), ret.stdout.decode("utf-8"))
         )
     return ret.stdout.decode("utf-8")
 
 python_env_dir = args.venv
+python_bin_dir = os.path.join(python_env_dir, "bin")
 
 print("Creating Python virtualenv at {}".format(python_env_dir))
-execute("python3 -mvenv {}".format(python_env_dir))
+venv.create(python_env_dir, with_pip=True)
 
 print("Install Python dependencies with pip")
-execute(". {}/bin/activate && pip3 install -r requirements.txt".format(python_env_dir))
+# prefer wheels to building packages, and keep downloaded packages for the next installation
+execute([
+    os.path.join(python_bin_dir, "pip3"), "install", "--prefer-binary",
+    "--cache-dir", ".pip-cache", "-r", "requirements.txt"
+])
 
 print("Configure mypy extensions")
-execute(". {}/bin/activate && mypy_boto3".format(python_env_dir))
+execute([os.path.join(python_bin_dir, "mypy_boto3")])
 
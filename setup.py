@@ -7,6 +7,9 @@ setup(
     name='faaskeeper',
     version='0.1.0-beta',
     install_requires=['boto3'],
+    extras_require={
+        'orjson': ['orjson'],
+    },
     url='https://github.com/mcopik/faaskeeper-client',
     license='BSD-3',
     author='Marcin Copik',